@@ -25,12 +25,14 @@ El cálculo considera:
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 from io import BytesIO
 import calendar
 from datetime import datetime, date
 import streamlit as st
 import json 
+import hashlib
 from pathlib import Path
 
 
@@ -74,6 +76,12 @@ st.set_page_config(
 AZUL_CORP = "#004b93"
 AMARILLO_CORP = "#ffcc00"
 
+# ==========================================================
+# LÍMITES DE VISUALIZACIÓN
+# ==========================================================
+# Filas de df_filtrado que se muestran en pantalla
+FILAS_VISTA = 1000
+
 # ==========================================================
 # ESTILOS PERSONALIZADOS (CSS)
 # ==========================================================
@@ -98,6 +106,47 @@ st.markdown(f"""
     </style>
     """, unsafe_allow_html=True)
 
+# ==========================================================
+# FUNCIÓN: LECTURA DE ARCHIVOS (CACHEADA)
+# ==========================================================
+# Máximo de resultados que cada caché en memoria conserva (umbral, fecha de corte o archivos
+# distintos generan entradas nuevas; las más antiguas se descartan)
+CACHE_MAX_ENTRADAS = 8
+
+# Columnas que usa el cálculo en cada anexo; el resto no se parsea
+COLUMNAS_AN9 = [
+    "Referencia",
+    "Fecha_de_registro_contable",
+    "Cuantia_bruta",
+    "Clase_de_riesgo_operacional_nivel_2",
+    "Cuentas_catalogo_afectadas"
+]
+COLUMNAS_AN10 = [
+    "Referencia",
+    "Cuentas_catalogo_afectadas",
+    "Cuantia_recuperada_por_seguros",
+    "Cuantia_de_otras_recuperaciones",
+    "Fecha_de_recuperacion"
+]
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_MAX_ENTRADAS)
+def load_excel(file_bytes: bytes, usecols: list) -> pd.DataFrame:
+    """
+    Lee un archivo Excel a partir de su contenido en bytes.
+
+    Solo se leen las columnas indicadas en usecols; Referencia se lee como
+    texto en ambos anexos para que el cruce no dependa de la inferencia de tipos.
+
+    Streamlit usa el hash del contenido como llave de caché, por lo que
+    volver a cargar el mismo archivo no vuelve a parsear el XLSX.
+    """
+    return pd.read_excel(
+        BytesIO(file_bytes),
+        engine="calamine",
+        usecols=usecols,
+        dtype={"Referencia": str}
+    )
+
 # ==========================================================
 # FUNCIÓN: EXPORTACIÓN A EXCEL
 # ==========================================================
@@ -113,37 +162,42 @@ def to_excel(res, cp, c_val, ipi):
     output = BytesIO()
     with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
         res['tabla_final'].to_excel(writer, sheet_name='Resumen Ejecutivo')
-        res['df_filtrado'].to_excel(writer, sheet_name='Eventos sobre Umbral')
-        res['DATA'].to_excel(writer, sheet_name='Data Procesada')
+        res['df_filtrado'].to_excel(writer, sheet_name='Eventos sobre Umbral', index=False)
+        res['DATA'].to_excel(writer, sheet_name='Data Procesada', index=False)
 
         df_resultados = pd.DataFrame({
             "Métrica": ["CP (Promedio x 15)", "Cociente (C)", "IPI Asignado"],
             "Valor": [cp, c_val, ipi]
         })
-        df_resultados.to_excel(writer, sheet_name='Resultados IPI')
+        df_resultados.to_excel(writer, sheet_name='Resultados IPI', index=False)
 
     return output.getvalue()
 
 # ==========================================================
 # FUNCIÓN: CALCULO DE IPI
 # ==========================================================
+# Límites superiores (inclusivos) de cada tramo del cociente C y el IPI asignado
+_IPI_BINS = np.array([0.2, 0.4, 0.7, 1.0, 1.4, 1.8, 2.3, 2.9, 3.6, 4.4])
+_IPI_VALS = np.array([0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3, 1.4, 1.5, 1.6, 1.7])
+
 def obtener_ipi(c):
-    if c <= 0.2: return 0.7
-    elif c <= 0.4: return 0.8
-    elif c <= 0.7: return 0.9
-    elif c <= 1.0: return 1.0
-    elif c <= 1.4: return 1.1
-    elif c <= 1.8: return 1.2
-    elif c <= 2.3: return 1.3
-    elif c <= 2.9: return 1.4
-    elif c <= 3.6: return 1.5
-    elif c <= 4.4: return 1.6
-    else: return 1.7
+    ipi = _IPI_VALS[np.searchsorted(_IPI_BINS, c, side='left')]
+    return float(ipi) if np.ndim(ipi) == 0 else ipi
+
+# ==========================================================
+# FUNCIÓN: PROMEDIO ANUAL DE PÉRDIDAS
+# ==========================================================
+def calcular_promedio_anual(tabla_final):
+    # Promedio anual: media de los totales por año (excluyendo la columna TOTAL)
+    if not tabla_final.empty:
+        per_year_totals = tabla_final.loc["TOTAL"].drop("TOTAL")
+        return per_year_totals.mean()
+    return 0
 
 # ==========================================================
 # FUNCIÓN PRINCIPAL DE CÁLCULO IPI
 # ==========================================================
-def ejecutar_calculo(An9, An10, umbral_input):
+def ejecutar_calculo(An9, An10, umbral_input, ultima_fecha):
     """
     Ejecuta el cálculo del componente de pérdida operacional.
 
@@ -152,6 +206,8 @@ def ejecutar_calculo(An9, An10, umbral_input):
     - An10: DataFrame RERO_RECUPERADO
     - df: Base EROs
     - umbral_input: Umbral monetario definido por el usuario
+    - ultima_fecha: Fecha de corte (último día del periodo); la ventana
+      de 60 meses termina en esta fecha
 
     Retorna:
     - DATA procesada
@@ -166,36 +222,47 @@ def ejecutar_calculo(An9, An10, umbral_input):
     An9["Fecha_de_registro_contable"] = pd.to_datetime(
         An9["Fecha_de_registro_contable"]
     )
-    ultima_fecha = pd.Timestamp(anio, mes_num, ultimo_dia)
+    ultima_fecha    = pd.Timestamp(ultima_fecha)
     fecha_min       = ultima_fecha - pd.DateOffset(months=60)
 
-    An9_2 = An9[
+    An9_2 = An9.loc[
         (An9["Fecha_de_registro_contable"] > fecha_min) &
         (An9["Fecha_de_registro_contable"] <= ultima_fecha)
-    ].copy()
+    ]
 
     # ------------------------------------------------------
     # 2. CRUCE CON RECUPERACIONES (ANEXO 10)
     # ------------------------------------------------------
-    An10["Cuentas Catálogo Recuperación"] = An10["Cuentas_catalogo_afectadas"]
-    An10["Recuperacion"] = (
-        An10["Cuantia_recuperada_por_seguros"] +
-        An10["Cuantia_de_otras_recuperaciones"]
-    )
-
     An10_agg = (
-        An10 
-        .groupby("Referencia", as_index=False) 
-        .agg({ 
-            "Recuperacion": "sum", 
-            "Fecha_de_recuperacion": "max", 
-            "Cuentas Catálogo Recuperación": "first"
+        An10
+        .assign(Recuperacion=
+            An10["Cuantia_recuperada_por_seguros"] +
+            An10["Cuantia_de_otras_recuperaciones"]
+        )
+        .groupby("Referencia")
+        .agg({
+            "Recuperacion": "sum",
+            "Fecha_de_recuperacion": "max",
+            "Cuentas_catalogo_afectadas": "first"
         })
+        # Códigos de cuenta como texto: al completar faltantes con "" la columna
+        # queda de un solo tipo (los códigos numéricos mezclados con "" no se pueden
+        # guardar en Parquet)
+        .astype({"Cuentas_catalogo_afectadas": "string"})
     )
 
-    AN9 = An9_2.merge(An10_agg, on="Referencia", how="left")
-
-    # Normalizamos recuperaciones como numérico y dejamos catálogo como cadena vacía si falta
+    # Un solo valor agregado por referencia: basta un reindex por Referencia, sin materializar
+    # un merge; el reindex ya deja solo las referencias de la ventana. A diferencia de map, reindex conserva el tipo de cada columna aunque An10_agg
+    # quede vacío (ventana sin recuperaciones): las fechas faltantes quedan como NaT.
+    # assign produce la única copia de la ventana filtrada sobre la que se escribe después
+    recuperaciones = An10_agg.reindex(An9_2["Referencia"]).set_axis(An9_2.index)
+    AN9 = An9_2.assign(**{
+        "Recuperacion"                  : recuperaciones["Recuperacion"],
+        "Fecha_de_recuperacion"         : recuperaciones["Fecha_de_recuperacion"],
+        "Cuentas Catálogo Recuperación" : recuperaciones["Cuentas_catalogo_afectadas"]
+    })
+
+    # Normalizamos recuperaciones como numérico y dejamos catálogo (texto) como cadena vacía si falta
     AN9["Recuperacion"] = pd.to_numeric(AN9["Recuperacion"], errors="coerce").fillna(0)
     AN9["Cuentas Catálogo Recuperación"] = AN9["Cuentas Catálogo Recuperación"].fillna("")
     
@@ -216,8 +283,8 @@ def ejecutar_calculo(An9, An10, umbral_input):
     # ------------------------------------------------------
     # 4. ESTRUCTURA BASE DE DATOS
     # ------------------------------------------------------
-    DATA = AN9[
-        [
+    DATA = AN9.loc[
+        :, [
             "Referencia",
             "Fecha_de_registro_contable",
             "Fecha_de_recuperacion",
@@ -228,24 +295,26 @@ def ejecutar_calculo(An9, An10, umbral_input):
             "Cuentas_catalogo_afectadas",
             "Cuentas Catálogo Recuperación"
         ]
-    ].copy()
+    ]
 
     # ------------------------------------------------------
     # 5. DEFINICIÓN DE AÑO BANDA (NOV–OCT)
     # ------------------------------------------------------
-    DATA["Fecha"] = pd.to_datetime(DATA["Fecha_de_registro_contable"], errors="coerce")
-    
-    # Calcular fecha mínima para referencia
-    fecha_min_data = DATA["Fecha"].min()
+    # La columna ya se convirtió a datetime en el paso 1
+    DATA["Fecha"] = DATA["Fecha_de_registro_contable"]
     
-    # Calcular meses desde la fecha mínima
-    DATA["meses_desde_inicio"] = (
-        (DATA["Fecha"].dt.year - fecha_min_data.year) * 12 + 
-        (DATA["Fecha"].dt.month - fecha_min_data.month)
+    # Meses absolutos (año*12 + mes) en un único paso de aritmética entera
+    meses_abs = (
+        DATA["Fecha"].dt.year.to_numpy(dtype=np.int32) * 12 +
+        DATA["Fecha"].dt.month.to_numpy(dtype=np.int32)
     )
-    
+
+    # Calcular meses desde la fecha mínima
+    DATA["meses_desde_inicio"] = meses_abs - (meses_abs.min() if meses_abs.size else 0)
+
     # Año banda = cada 12 meses es una banda
-    DATA["Año_banda"] = (DATA["meses_desde_inicio"] // 12) + 1
+    # Las bandas son enteros pequeños (1..6): int16 basta
+    DATA["Año_banda"] = (DATA["meses_desde_inicio"] // 12 + 1).astype(np.int16)
 
     # ------------------------------------------------------
     # 6. IDENTIFICACIÓN DE EVENTOS TIPO A
@@ -262,22 +331,21 @@ def ejecutar_calculo(An9, An10, umbral_input):
     ]
     
     refs_umbral = set(df_filtrado["Referencia"].unique())
-    DATA["Tipo de umbral"] = DATA["Referencia"].apply(lambda x: "A" if x in refs_umbral else "B")
+    ref_mask    = DATA["Referencia"].isin(refs_umbral)
 
     # ------------------------------------------------------
     # 7. TABLA FINAL CONSOLIDADA
     # ------------------------------------------------------
-    totalizador_umbral = pd.DataFrame([
-        {
-            "Año": anio, 
-            "Total Pérdida neta": 
-            df_filtrado[df_filtrado["Año_banda"] == anio]
-            ["Pérdida neta ( Pérdida bruta menos recuperaciones)"].sum()
-        } 
-        for anio in df_filtrado["Año_banda"].unique()
-    ])
-
-    DATA2 = DATA[DATA["Tipo de umbral"] == 'B'].copy()
+    totalizador_umbral = (
+        df_filtrado
+        .groupby("Año_banda", as_index=False)
+        ["Pérdida neta ( Pérdida bruta menos recuperaciones)"]
+        .sum()
+        .rename(columns={
+            "Año_banda": "Año",
+            "Pérdida neta ( Pérdida bruta menos recuperaciones)": "Total Pérdida neta"
+        })
+    )
 
     map_riesgo_nivel_2 = {
     11: "1.1 Actividades no Autorizadas",
@@ -317,56 +385,169 @@ def ejecutar_calculo(An9, An10, umbral_input):
     78: "7.8 Otros"
     }
     
-    DATA2["Clase_de_riesgo_operacional_nivel_2"] = DATA2["Clase_de_riesgo_operacional_nivel_2"].map(map_riesgo_nivel_2)
-    DATA["Clase_de_riesgo_operacional_nivel_2"] = DATA["Clase_de_riesgo_operacional_nivel_2"].map(map_riesgo_nivel_2)
-
-    tabla_riesgo_banda          = DATA2.groupby(["Clase_de_riesgo_operacional_nivel_2", "Año_banda"], observed=True)["Cuantia_bruta"].sum().reset_index()    
-    tabla_riesgo_banda_umbral   = tabla_riesgo_banda[tabla_riesgo_banda["Cuantia_bruta"] >= umbral_input]
-    totalizador_umbral_anio     = tabla_riesgo_banda_umbral.groupby("Año_banda")["Cuantia_bruta"].sum().reset_index()      
-
-    A = totalizador_umbral.set_index("Año")["Total Pérdida neta"] if not totalizador_umbral.empty else pd.Series(dtype=float)
-    A.name = "Tipo A"
-    B = totalizador_umbral_anio.set_index("Año_banda")["Cuantia_bruta"] if not totalizador_umbral_anio.empty else pd.Series(dtype=float)
-    B.name = "Tipo B"
-
-    # Consolidar por año: columnas = años, filas = Tipo A / Tipo B
-    tabla_final = pd.concat([A, B], axis=1).fillna(0).T
-    tabla_final["TOTAL"] = tabla_final.sum(axis=1)
-    # Agregar fila TOTAL (suma por columnas/años)
-    tabla_final.loc["TOTAL"] = tabla_final.sum()
-    # Promedio anual: media de los totales por año (excluyendo la columna TOTAL)
-    if not tabla_final.empty:
-        per_year_totals = tabla_final.loc["TOTAL"].drop("TOTAL")
-        promedio_anual = per_year_totals.mean()
-    else:
-        promedio_anual = 0
-
-    clases_B = set(
-        zip(
-            tabla_riesgo_banda_umbral["Clase_de_riesgo_operacional_nivel_2"],
-            tabla_riesgo_banda_umbral["Año_banda"]
-        )
+    # Vocabulario pequeño y fijo: se guarda como categoría para reducir memoria y acelerar los groupby.
+    # Los códigos nivel 2 son enteros acotados (11..78), así que una tabla indexada por código
+    # reemplaza la búsqueda en el diccionario fila a fila (-1 = código sin clase)
+    categorias_riesgo = list(map_riesgo_nivel_2.values())
+    lookup_riesgo = np.full(max(map_riesgo_nivel_2) + 1, -1, dtype=np.int8)
+    lookup_riesgo[list(map_riesgo_nivel_2.keys())] = np.arange(len(categorias_riesgo))
+
+    codigos_riesgo  = pd.to_numeric(DATA["Clase_de_riesgo_operacional_nivel_2"], errors="coerce").to_numpy(dtype=float)
+    codigo_valido   = (codigos_riesgo >= 0) & (codigos_riesgo < lookup_riesgo.size) & (codigos_riesgo % 1 == 0)
+    codigos_cat     = np.full(codigos_riesgo.shape, -1, dtype=np.int8)
+    codigos_cat[codigo_valido] = lookup_riesgo[codigos_riesgo[codigo_valido].astype(np.int64)]
+
+    DATA["Clase_de_riesgo_operacional_nivel_2"] = pd.Categorical.from_codes(codigos_cat, categories=categorias_riesgo)
+
+    # DATA2 solo se lee: basta la selección, sin copia
+    DATA2 = DATA.loc[~ref_mask]
+
+    # Un único groupby por (clase, año banda); el filtro por umbral y el total
+    # por año se derivan de este resultado sin volver a agrupar DATA2
+    tabla_riesgo_banda          = DATA2.groupby(["Clase_de_riesgo_operacional_nivel_2", "Año_banda"], observed=True)["Cuantia_bruta"].sum()
+    tabla_riesgo_banda_umbral   = tabla_riesgo_banda[tabla_riesgo_banda >= umbral_input]
+    totalizador_umbral_anio     = tabla_riesgo_banda_umbral.groupby(level="Año_banda").sum()
+
+    A = totalizador_umbral.set_index("Año")["Total Pérdida neta"]
+    B = totalizador_umbral_anio
+
+    # Consolidar por año: columnas = años + TOTAL, filas = Tipo A / Tipo B / TOTAL.
+    # Se arma una sola matriz y se construye el DataFrame una vez
+    anios = sorted(int(a) for a in set(A.index) | set(B.index))
+    valores = np.zeros((3, len(anios) + 1))
+    valores[0, :-1] = A.reindex(anios, fill_value=0).to_numpy()
+    valores[1, :-1] = B.reindex(anios, fill_value=0).to_numpy()
+    valores[2, :-1] = valores[0, :-1] + valores[1, :-1]
+    valores[:, -1]  = valores[:, :-1].sum(axis=1)
+
+    tabla_final = pd.DataFrame(
+        valores,
+        index=["Tipo A", "Tipo B", "TOTAL"],
+        columns=[*anios, "TOTAL"]
     )
+    promedio_anual = calcular_promedio_anual(tabla_final)
 
-    def asignar_umbral(row):
-        # Verificamos si la columna existe en la fila actual
-        ref     = row.get("Referencia"                          , None)
-        clase   = row.get("Clase_de_riesgo_operacional_nivel_2" , None)
-        anio    = row.get("Año_banda"                       , None)
-        
-        if ref in refs_umbral:
-            return "A"
-        elif (clase, anio) in clases_B:
-            return "B"
-        else:
-            return "N/A"
+    clases_B = tabla_riesgo_banda_umbral.index
 
-    DATA = DATA.copy()
-    DATA["Tipo de umbral"] = DATA.apply(asignar_umbral, axis=1)
+    # Clasificación vectorizada: A si la referencia supera el umbral,
+    # B si su par (clase, año banda) supera el umbral, N/A en otro caso
+    clase_mask  = pd.MultiIndex.from_arrays([
+        DATA["Clase_de_riesgo_operacional_nivel_2"],
+        DATA["Año_banda"]
+    ]).isin(clases_B)
+
+    DATA["Tipo de umbral"] = np.where(
+        ref_mask, "A",
+        np.where(clase_mask, "B", "N/A")
+    )
+    DATA["Tipo de umbral"] = DATA["Tipo de umbral"].astype("category")
 
 
     return {"DATA": DATA, "df_filtrado": df_filtrado, "tabla_final": tabla_final, "promedio_anual": promedio_anual}
 
+# ==========================================================
+# CACHÉ EN DISCO (PARQUET)
+# ==========================================================
+# Junto a main2.py, sin importar desde qué directorio se lance Streamlit
+CACHE_DIR = Path(__file__).parent / "cache"
+TABLAS_CACHE = ("DATA", "df_filtrado", "tabla_final")
+
+# Errores de escritura/lectura de Parquet (pyarrow ausente, tipos mixtos, disco)
+ERRORES_CACHE = (ImportError, OSError, ValueError, TypeError, NotImplementedError)
+
+# Versión del código: hash de este archivo. Cualquier cambio en la lógica del cálculo
+# invalida los resultados guardados con una versión anterior
+VERSION_CODIGO = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+
+def llave_cache(an9_bytes, an10_bytes, umbral_input, ultima_fecha):
+    """
+    Llave de caché: hash del contenido de ambos archivos, el umbral, la fecha
+    de corte y la versión del código que produjo el resultado.
+    """
+    h = hashlib.sha256()
+    for parte in (an9_bytes, an10_bytes, f"{umbral_input}|{ultima_fecha}|{VERSION_CODIGO}".encode("utf-8")):
+        h.update(hashlib.sha256(parte).digest())
+    return h.hexdigest()
+
+def leer_cache(llave):
+    """
+    Recupera un resultado previo desde Parquet, o None si no existe o no se puede leer.
+    """
+    rutas = {tabla: CACHE_DIR / f"{llave}_{tabla}.parquet" for tabla in TABLAS_CACHE}
+    if not all(ruta.exists() for ruta in rutas.values()):
+        return None
+    try:
+        res = {tabla: pd.read_parquet(ruta) for tabla, ruta in rutas.items()}
+    except ERRORES_CACHE:
+        return None
+
+    # Parquet exige nombres de columna en texto: se restauran los años como enteros
+    res["tabla_final"] = res["tabla_final"].rename(columns=lambda c: int(c) if c.isdigit() else c)
+    res["promedio_anual"] = calcular_promedio_anual(res["tabla_final"])
+    return res
+
+def guardar_cache(llave, res):
+    """
+    Persiste las tablas del resultado en Parquet. La caché es opcional:
+    si no se puede escribir (por ejemplo, columnas con tipos mixtos) se ignora.
+
+    Importante: en cache/ queda guardada la data cruda de eventos de pérdida
+    (tabla DATA). Solo se conservan los CACHE_MAX_ENTRADAS resultados más recientes.
+    """
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        for tabla in TABLAS_CACHE:
+            res[tabla].rename(columns=str).to_parquet(
+                CACHE_DIR / f"{llave}_{tabla}.parquet", compression="zstd"
+            )
+    except ERRORES_CACHE:
+        pass
+    podar_cache()
+
+def podar_cache():
+    """
+    Elimina los resultados en disco más antiguos (por fecha de modificación
+    de su archivo DATA), dejando solo los CACHE_MAX_ENTRADAS más recientes.
+    """
+    try:
+        archivos_data = sorted(
+            CACHE_DIR.glob("*_DATA.parquet"),
+            key=lambda ruta: ruta.stat().st_mtime,
+            reverse=True
+        )
+        for ruta in archivos_data[CACHE_MAX_ENTRADAS:]:
+            llave = ruta.name[:-len("_DATA.parquet")]
+            for tabla in TABLAS_CACHE:
+                (CACHE_DIR / f"{llave}_{tabla}.parquet").unlink(missing_ok=True)
+    except OSError:
+        pass
+
+# ==========================================================
+# FUNCIÓN: CÁLCULO CACHEADO
+# ==========================================================
+@st.cache_data(show_spinner=False, max_entries=CACHE_MAX_ENTRADAS)
+def calcular_cacheado(an9_bytes: bytes, an10_bytes: bytes, umbral_input, ultima_fecha):
+    """
+    Versión cacheada de ejecutar_calculo.
+
+    La llave de caché es el contenido de ambos archivos, el umbral y la
+    fecha de corte, los mismos valores que recibe el cálculo.
+    En memoria se usa st.cache_data; entre sesiones, la caché Parquet en disco.
+    """
+    llave = llave_cache(an9_bytes, an10_bytes, umbral_input, ultima_fecha)
+    res = leer_cache(llave)
+    if res is not None:
+        return res
+
+    res = ejecutar_calculo(
+        load_excel(an9_bytes, COLUMNAS_AN9),
+        load_excel(an10_bytes, COLUMNAS_AN10),
+        umbral_input,
+        ultima_fecha
+    )
+    guardar_cache(llave, res)
+    return res
+
 # ==========================================================
 # ENCABEZADO CORPORATIVOS
 # ==========================================================
@@ -401,10 +582,10 @@ with col_f2: file_an10  = st.file_uploader  ("📂 RERO_RECUPERADO"   ,   type=[
 
 if file_an9 and file_an10:
     if st.button("▶ Ejecutar cálculo IPI", width="stretch"):
-        An9     = pd.read_excel(file_an9 )
-        An10    = pd.read_excel(file_an10)
-
-        res = ejecutar_calculo(An9, An10, umbral_val)
+        res = calcular_cacheado(
+            file_an9.getvalue(), file_an10.getvalue(), umbral_val,
+            date(anio, mes_num, ultimo_dia)
+        )
 
 # ==========================================================
 # CALCULO COCIENTE (C)
@@ -454,7 +635,8 @@ if file_an9 and file_an10:
             
             with c2:
                 st.subheader("Distribución por Segmento")
-                fig_pie = px.pie(res['DATA'], values='Pérdida neta ( Pérdida bruta menos recuperaciones)', 
+                pie_data = res['DATA'].groupby("Tipo de umbral", observed=True, as_index=False)["Pérdida neta ( Pérdida bruta menos recuperaciones)"].sum()
+                fig_pie = px.pie(pie_data, values='Pérdida neta ( Pérdida bruta menos recuperaciones)', 
                                  names='Tipo de umbral', hole=0.5,
                                  color_discrete_sequence=[AZUL_CORP, AMARILLO_CORP])
                 st.plotly_chart(fig_pie, width="stretch", key="pie_corp")
@@ -464,7 +646,16 @@ if file_an9 and file_an10:
             st.table    (res['tabla_final'].style.format("${:,.0f}"))
             
             st.subheader("Listado de Eventos sobre el Umbral")
-            st.dataframe(res['df_filtrado'], width="stretch")
+            # Solo se envían al navegador las primeras filas; el listado completo se descarga en CSV
+            st.dataframe(res['df_filtrado'].head(FILAS_VISTA), width="stretch")
+            if len(res['df_filtrado']) > FILAS_VISTA:
+                st.caption(f"Mostrando {FILAS_VISTA:,} de {len(res['df_filtrado']):,} eventos. Descargue el listado completo.")
+            st.download_button(
+                label       =   "📄 Descargar listado completo (CSV)",
+                data        =   res['df_filtrado'].to_csv(index=False).encode("utf-8-sig"),
+                file_name   =   "Eventos_sobre_Umbral.csv",
+                mime        =   "text/csv"
+            )
 
 
 data = leer_data()
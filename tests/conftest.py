@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# main2.py vive en la raíz del repositorio
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
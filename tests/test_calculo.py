@@ -0,0 +1,155 @@
+"""
+Pruebas del cálculo del componente de pérdida (ejecutar_calculo).
+"""
+
+import os
+import time
+
+import pandas as pd
+
+import main2
+
+UMBRAL = 1000.0
+FECHA_CORTE = pd.Timestamp(2025, 1, 31)
+
+
+def _an9(referencias, fechas, cuantias, clases=None):
+    return pd.DataFrame({
+        "Referencia": referencias,
+        "Fecha_de_registro_contable": pd.to_datetime(fechas),
+        "Cuantia_bruta": cuantias,
+        "Clase_de_riesgo_operacional_nivel_2": clases or [71] * len(referencias),
+        "Cuentas_catalogo_afectadas": [510000] * len(referencias),
+    })
+
+
+def _an10(referencias, recuperaciones):
+    return pd.DataFrame({
+        "Referencia": referencias,
+        "Cuentas_catalogo_afectadas": [410000] * len(referencias),
+        "Cuantia_recuperada_por_seguros": recuperaciones,
+        "Cuantia_de_otras_recuperaciones": [0.0] * len(referencias),
+        "Fecha_de_recuperacion": pd.to_datetime(["2024-06-30"] * len(referencias)),
+    })
+
+
+def _fecha_en_ventana():
+    return FECHA_CORTE - pd.DateOffset(months=6)
+
+
+def test_recuperaciones_se_descuentan_de_la_perdida():
+    fecha = _fecha_en_ventana()
+    res = main2.ejecutar_calculo(
+        _an9(["R1", "R2"], [fecha, fecha], [5000.0, 500.0]),
+        _an10(["R1"], [1000.0]),
+        UMBRAL,
+        FECHA_CORTE
+    )
+
+    data = res["DATA"].set_index("Referencia")
+    assert data.loc["R1", "Pérdida neta ( Pérdida bruta menos recuperaciones)"] == 4000.0
+    assert data.loc["R2", "Cuantia_recuperada_por_seguros"] == 0.0
+    assert pd.isna(data.loc["R2", "Fecha_de_recuperacion"])
+    assert list(res["df_filtrado"]["Referencia"]) == ["R1"]
+    assert res["tabla_final"].loc["Tipo A", "TOTAL"] == 4000.0
+
+
+def test_clase_y_banda_sobre_umbral_se_clasifica_tipo_b():
+    fecha = _fecha_en_ventana()
+    # R1 supera el umbral por sí sola (A); R2 y R3 no, pero juntas suman 1200
+    # en la clase 21 y la misma banda (B); R4 (clase 72) y R5 (código 99 sin
+    # clase) quedan por debajo (N/A)
+    res = main2.ejecutar_calculo(
+        _an9(
+            ["R1", "R2", "R3", "R4", "R5"],
+            [fecha] * 5,
+            [5000.0, 600.0, 600.0, 300.0, 900.0],
+            clases=[71, 21, 21, 72, 99]
+        ),
+        _an10(["X1"], [0.0]),
+        UMBRAL,
+        FECHA_CORTE
+    )
+
+    tipos = res["DATA"].set_index("Referencia")["Tipo de umbral"]
+    assert tipos.to_dict() == {"R1": "A", "R2": "B", "R3": "B", "R4": "N/A", "R5": "N/A"}
+    assert res["DATA"].set_index("Referencia").loc["R2", "Clase_de_riesgo_operacional_nivel_2"] == "2.1 Hurto y Fraude Externo"
+    assert pd.isna(res["DATA"].set_index("Referencia").loc["R5", "Clase_de_riesgo_operacional_nivel_2"])
+
+    assert res["tabla_final"].loc["Tipo A", 1] == 5000.0
+    assert res["tabla_final"].loc["Tipo B", 1] == 1200.0
+    assert res["tabla_final"].loc["Tipo B", "TOTAL"] == 1200.0
+    assert res["tabla_final"].loc["TOTAL", "TOTAL"] == 6200.0
+
+
+def test_ventana_sin_recuperaciones_coincidentes():
+    fecha = _fecha_en_ventana()
+    res = main2.ejecutar_calculo(
+        _an9(["R1", "R2"], [fecha, fecha], [5000.0, 500.0]),
+        _an10(["X1"], [1000.0]),
+        UMBRAL,
+        FECHA_CORTE
+    )
+
+    assert (res["DATA"]["Cuantia_recuperada_por_seguros"] == 0).all()
+    assert res["DATA"]["Fecha_de_recuperacion"].isna().all()
+    assert res["tabla_final"].loc["Tipo A", "TOTAL"] == 5000.0
+
+
+def test_ventana_vacia():
+    fuera_de_ventana = FECHA_CORTE + pd.DateOffset(years=1)
+    res = main2.ejecutar_calculo(
+        _an9(["R1"], [fuera_de_ventana], [5000.0]),
+        _an10(["R1"], [1000.0]),
+        UMBRAL,
+        FECHA_CORTE
+    )
+
+    assert res["DATA"].empty
+    assert res["df_filtrado"].empty
+
+
+def test_cache_parquet_conserva_el_resultado(tmp_path, monkeypatch):
+    monkeypatch.setattr(main2, "CACHE_DIR", tmp_path)
+    fecha = _fecha_en_ventana()
+    # R2 sin recuperación: el catálogo de recuperación mezcla "" con códigos numéricos
+    res = main2.ejecutar_calculo(
+        _an9(["R1", "R2"], [fecha, fecha], [5000.0, 500.0]),
+        _an10(["R1"], [1000.0]),
+        UMBRAL,
+        FECHA_CORTE
+    )
+
+    llave = main2.llave_cache(b"an9", b"an10", UMBRAL, "periodo")
+    main2.guardar_cache(llave, res)
+    cacheado = main2.leer_cache(llave)
+
+    assert cacheado is not None
+    pd.testing.assert_frame_equal(cacheado["tabla_final"], res["tabla_final"])
+    pd.testing.assert_frame_equal(cacheado["DATA"], res["DATA"])
+    assert cacheado["promedio_anual"] == res["promedio_anual"]
+
+
+def test_cache_parquet_conserva_solo_los_mas_recientes(tmp_path, monkeypatch):
+    monkeypatch.setattr(main2, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(main2, "CACHE_MAX_ENTRADAS", 2)
+    fecha = _fecha_en_ventana()
+    res = main2.ejecutar_calculo(
+        _an9(["R1"], [fecha], [5000.0]),
+        _an10(["R1"], [1000.0]),
+        UMBRAL,
+        FECHA_CORTE
+    )
+
+    llaves = [main2.llave_cache(b"an9", b"an10", umbral, "periodo") for umbral in (1, 2, 3)]
+    for antiguedad, llave in zip((300, 200, 100), llaves):
+        main2.guardar_cache(llave, res)
+        # Fechas de modificación explícitas para no depender de la resolución del reloj
+        for ruta in tmp_path.glob(f"{llave}_*.parquet"):
+            os.utime(ruta, (time.time() - antiguedad,) * 2)
+    main2.podar_cache()
+
+    assert main2.leer_cache(llaves[0]) is None
+    assert main2.leer_cache(llaves[1]) is not None
+    assert main2.leer_cache(llaves[2]) is not None
+    assert len(list(tmp_path.glob("*.parquet"))) == 2 * len(main2.TABLAS_CACHE)